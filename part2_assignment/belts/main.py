@@ -1,8 +1,16 @@
+from array import array
 from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional, Set
 import sys
 import json
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the CLI then uses the stdlib json module
+    orjson = None
+
 # --------------------------
 # Top-level helper functions
 # --------------------------
@@ -15,94 +23,289 @@ def base_name(nm: str) -> str:
         return nm[:-5]
     return nm
 
-def edge_sort_key(E: "EdgeSpec"):
-    """Deterministic sort key for edges."""
-    return (E.u, E.v, E.name or "")
+# ==========================
+# Max-flow kernels
+# ==========================
+# Written against indexable buffers only, so the same code runs as plain Python
+# over lists (small graphs) and, through _jit_kernels(), compiled by numba over
+# numpy arrays (large graphs).
+
+# Forward-arc counts from which the compiled paths repay their import / JIT cost
+SCIPY_MIN_ARCS = 20_000
+NUMBA_MIN_ARCS = 40_000
+
+def _bfs_levels(adj_start, adj_flat, e_to, e_cap, level, it, q, s, t, EPS):
+    """Level graph BFS over the CSR arrays; also rewinds the current-arc offsets it."""
+    for v in range(len(level)):
+        level[v] = -1
+        it[v] = 0
+    level[s] = 0
+    q[0] = s
+    head = 0
+    tail = 1
+    while head < tail:
+        v = q[head]
+        head += 1
+        for k in range(adj_start[v], adj_start[v + 1]):
+            e = adj_flat[k]
+            to = e_to[e]
+            if e_cap[e] > EPS and level[to] < 0:
+                level[to] = level[v] + 1
+                q[tail] = to
+                tail += 1
+    return level[t] >= 0
+
+def _blocking_flow(adj_start, adj_flat, e_to, e_rev, e_cap, level, it, stack_v, stack_e, s, t, EPS):
+    """
+    Iterative Dinic blocking flow on the current level graph.
+    it[v] is the current-arc offset into v's adjacency; dead ends get level -1.
+    stack_v / stack_e are scratch buffers of length n.
+    Returns the total flow augmented in this phase.
+    """
+    total = 0.0
+    depth = 0
+    stack_v[0] = s
+    while depth >= 0:
+        v = stack_v[depth]
+        if v == t:
+            f = e_cap[stack_e[0]]
+            for d in range(1, depth):
+                if e_cap[stack_e[d]] < f:
+                    f = e_cap[stack_e[d]]
+            for d in range(depth):
+                e = stack_e[d]
+                e_cap[e] -= f
+                e_cap[e_rev[e]] += f
+            total += f
+            # Retreat to the tail of the first saturated edge on the path
+            for d in range(depth):
+                if e_cap[stack_e[d]] <= EPS:
+                    depth = d
+                    break
+            continue
+        start = adj_start[v]
+        deg = adj_start[v + 1] - start
+        advanced = False
+        while it[v] < deg:
+            e = adj_flat[start + it[v]]
+            to = e_to[e]
+            if e_cap[e] > EPS and level[to] == level[v] + 1:
+                stack_e[depth] = e
+                depth += 1
+                stack_v[depth] = to
+                advanced = True
+                break
+            it[v] += 1
+        if not advanced:
+            level[v] = -1
+            depth -= 1
+            if depth >= 0:
+                it[stack_v[depth]] += 1
+    return total
+
+def _reachable(adj_start, adj_flat, e_to, e_cap, visited, q, s, EPS):
+    """Residual-graph BFS from s; marks reachable nodes in the visited mask."""
+    visited[s] = True
+    q[0] = s
+    head = 0
+    tail = 1
+    while head < tail:
+        v = q[head]
+        head += 1
+        for k in range(adj_start[v], adj_start[v + 1]):
+            e = adj_flat[k]
+            to = e_to[e]
+            if e_cap[e] > EPS and not visited[to]:
+                visited[to] = True
+                q[tail] = to
+                tail += 1
+
+_PLAIN_KERNELS = (_bfs_levels, _blocking_flow, _reachable)
+_jitted = None
+
+def _jit_kernels():
+    """
+    The kernels compiled by numba, which is imported on first use; None without numba.
+    No cache=True: numba's on-disk index records the importing module's name, so a
+    cache written through `import belts.main` breaks a later `python belts/main.py`.
+    """
+    global _jitted
+    if _jitted is None:
+        try:
+            from numba import njit
+        except ImportError:  # numba is optional
+            _jitted = False
+        else:
+            jit = njit(boundscheck=False)
+            _jitted = tuple(jit(fn) for fn in _PLAIN_KERNELS)
+    return _jitted or None
 
 # ==========================
 # Small Dinic implementation
 # ==========================
 
-@dataclass
-class _Edge:
-    to: int
-    rev: int
-    cap: float
-
 class Dinic:
+    """
+    Dinic max-flow over struct-of-arrays edge storage.
+
+    Edges are appended to packed typed arrays (e_to, e_rev, e_cap) while the
+    graph is built; finalize() freezes them together with a CSR adjacency
+    (adj_start, adj_flat) so traversals do indexed loads instead of attribute
+    lookups on per-edge objects. Graphs of at least NUMBA_MIN_ARCS arcs are frozen
+    into numpy arrays for the numba kernels; smaller ones into plain lists, which
+    the interpreter indexes faster than numpy scalars.
+    """
     def __init__(self, n: int, eps: float = 1e-9):
         self.n = n
-        self.g: List[List[_Edge]] = [[] for _ in range(n)]
-        self.level = [0]*n
-        self.it = [0]*n
+        self.e_to = array("i")
+        self.e_rev = array("i")
+        self.e_cap = array("d")
+        self.adj: List[array] = [array("i") for _ in range(n)]
+        self.adj_start = None
+        self.adj_flat = None
+        self.kernels = _PLAIN_KERNELS
         self.EPS = eps
 
+    @property
+    def num_arcs(self) -> int:
+        return len(self.e_to) // 2
+
     def add_edge(self, fr: int, to: int, cap: float):
         assert cap >= -self.EPS, "Negative capacity not allowed"
-        fwd = _Edge(to=to, rev=len(self.g[to]), cap=max(0.0, cap))
-        rev = _Edge(to=fr, rev=len(self.g[fr]), cap=0.0)
-        self.g[fr].append(fwd)
-        self.g[to].append(rev)
-        return (fr, len(self.g[fr])-1)
-
-    def _bfs(self, s: int, t: int) -> bool:
-        from collections import deque
-        self.level = [-1]*self.n
-        q = deque()
-        self.level[s] = 0
-        q.append(s)
-        while q:
-            v = q.popleft()
-            for e in self.g[v]:
-                if e.cap > self.EPS and self.level[e.to] < 0:
-                    self.level[e.to] = self.level[v] + 1
-                    q.append(e.to)
-        return self.level[t] >= 0
-
-    def _dfs(self, v: int, t: int, f: float) -> float:
-        if v == t:
-            return f
-        itv = self.it[v]
-        for i in range(itv, len(self.g[v])):
-            self.it[v] = i
-            e = self.g[v][i]
-            if e.cap > self.EPS and self.level[v] < self.level[e.to]:
-                d = self._dfs(e.to, t, min(f, e.cap))
-                if d > self.EPS:
-                    e.cap -= d
-                    self.g[e.to][e.rev].cap += d
-                    return d
-        return 0.0
+        idx = len(self.e_to)
+        self.e_to.append(to); self.e_rev.append(idx + 1); self.e_cap.append(max(0.0, cap))
+        self.e_to.append(fr); self.e_rev.append(idx); self.e_cap.append(0.0)
+        self.adj[fr].append(idx)
+        self.adj[to].append(idx + 1)
+        return (fr, idx)
+
+    def finalize(self):
+        """Freeze the edge arrays, build the CSR adjacency and the scratch buffers."""
+        deg = array("i", (len(a) for a in self.adj))
+        adj_start = array("i", [0]) * (self.n + 1)
+        for v in range(self.n):
+            adj_start[v + 1] = adj_start[v] + deg[v]
+        flat = array("i")
+        for a in self.adj:
+            flat.extend(a)
+        self.adj = None
+
+        jitted = _jit_kernels() if self.num_arcs >= NUMBA_MIN_ARCS else None
+        if jitted is not None:
+            self.kernels = jitted
+            as_ints = lambda a: np.frombuffer(a, dtype=np.int32).copy()
+            self.e_cap = np.frombuffer(self.e_cap, dtype=np.float64).copy()
+            self.level = np.full(self.n, -1, dtype=np.int32)
+            zeros = lambda: np.zeros(self.n, dtype=np.int32)
+        else:
+            as_ints = array.tolist
+            self.e_cap = self.e_cap.tolist()
+            self.level = [-1] * self.n
+            zeros = lambda: [0] * self.n
+        self.e_to, self.e_rev = as_ints(self.e_to), as_ints(self.e_rev)
+        self.adj_start, self.adj_flat = as_ints(adj_start), as_ints(flat)
+        # Scratch buffers reused by every BFS / blocking-flow phase
+        self.it, self._q, self._stack_v, self._stack_e = zeros(), zeros(), zeros(), zeros()
 
     def max_flow(self, s: int, t: int) -> float:
+        if self.adj_start is None:
+            self.finalize()
+        bfs, blocking_flow, _ = self.kernels
+        e_cap, EPS = self.e_cap, self.EPS
+        s_arcs = [self.adj_flat[k] for k in range(self.adj_start[s], self.adj_start[s + 1])]
         flow = 0.0
-        INF = 1e100
-        while self._bfs(s, t):
-            self.it = [0]*self.n
-            while True:
-                f = self._dfs(s, t, INF)
-                if f <= self.EPS:
-                    break
-                flow += f
-        return flow
+        while True:
+            # Source arcs all saturated: no augmenting path can exist, skip the BFS
+            if sum(c for c in (e_cap[e] for e in s_arcs) if c > EPS) <= EPS:
+                break
+            if not bfs(self.adj_start, self.adj_flat, self.e_to, e_cap,
+                       self.level, self.it, self._q, s, t, EPS):
+                break
+            flow += blocking_flow(self.adj_start, self.adj_flat, self.e_to, self.e_rev, e_cap,
+                                  self.level, self.it, self._stack_v, self._stack_e, s, t, EPS)
+        return float(flow)
 
     def flow_used(self, fr: int, idx: int) -> float:
-        fwd = self.g[fr][idx]
-        rev = self.g[fwd.to][fwd.rev]
-        return rev.cap  # reverse capacity equals flow pushed
-
-    def residual_reachable_from(self, s: int) -> Set[int]:
-        seen = set()
-        from collections import deque
-        q = deque([s])
-        seen.add(s)
-        while q:
-            v = q.popleft()
-            for e in self.g[v]:
-                if e.cap > self.EPS and e.to not in seen:
-                    seen.add(e.to)
-                    q.append(e.to)
-        return seen
+        return float(self.e_cap[self.e_rev[idx]])  # reverse capacity equals flow pushed
+
+    def residual_reachable_from(self, s: int) -> np.ndarray:
+        """Boolean mask of nodes reachable from s in the residual graph."""
+        visited = np.zeros(self.n, dtype=np.bool_) if isinstance(self.e_cap, np.ndarray) else [False] * self.n
+        self.kernels[2](self.adj_start, self.adj_flat, self.e_to, self.e_cap,
+                        visited, self._q, s, self.EPS)
+        return np.asarray(visited, dtype=np.bool_)
+
+_INT32_MAX = np.iinfo(np.int32).max
+
+def scipy_max_flow(flow: Dinic, s: int, t: int, max_decimals: int = 6) -> Optional[float]:
+    """
+    Max-flow through scipy.sparse.csgraph.maximum_flow on the finalized edge arrays.
+
+    scipy is imported on first use. Capacities are scaled by the smallest 10**k
+    (k <= max_decimals) that makes them integral to within flow.EPS and must fit
+    int32, also once parallel arcs are summed. Returns None when scipy is missing
+    or no such scaling exists, so the caller can fall back to Dinic.max_flow. On success the residual capacities in
+    flow.e_cap are written back, so flow_used and residual_reachable_from behave
+    as after Dinic.max_flow.
+    """
+    if flow.adj_start is None:
+        flow.finalize()
+    if flow.num_arcs == 0:
+        return 0.0
+
+    e_to, e_rev = np.asarray(flow.e_to), np.asarray(flow.e_rev)
+    e_cap = np.asarray(flow.e_cap, dtype=np.float64)
+    fwd = np.arange(0, len(e_to), 2)  # add_edge stores forward arcs at even indices
+    rev = e_rev[fwd]
+    tails = e_to[rev]
+    heads = e_to[fwd]
+    caps = e_cap[fwd]
+    if not np.all(np.isfinite(caps)):
+        return None  # an infinite capacity has no integer scaling
+
+    for k in range(max_decimals + 1):
+        scale = 10.0 ** k
+        scaled = np.rint(caps * scale)
+        # Rounding may move a capacity by at most EPS in original units
+        if np.all(np.abs(caps * scale - scaled) <= flow.EPS * scale):
+            break
+    else:
+        return None
+    if scaled.size and (scaled.max() > _INT32_MAX or scaled[tails == s].sum() > _INT32_MAX):
+        return None
+    ci = scaled.astype(np.int64)
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import maximum_flow
+    except ImportError:  # scipy is optional; the Dinic kernels are used instead
+        return None
+
+    loop = tails == heads
+    graph = csr_matrix((ci[~loop], (tails[~loop], heads[~loop])), shape=(flow.n, flow.n))
+    graph.sum_duplicates()
+    # Parallel arcs are merged into one entry, whose total must also fit int32
+    if graph.nnz and graph.data.max() > _INT32_MAX:
+        return None
+    graph.data = graph.data.astype(np.int32)
+    res = maximum_flow(graph, s, t)
+    net = np.asarray(res.flow[tails, heads]).ravel().astype(np.int64)
+
+    # Spread each (tail, head) pair's net flow over its parallel arcs in insertion order
+    order = np.lexsort((fwd, heads, tails))
+    t_s, h_s, c_s, n_s = tails[order], heads[order], ci[order], net[order]
+    new_group = np.ones(len(order), dtype=np.bool_)
+    new_group[1:] = (t_s[1:] != t_s[:-1]) | (h_s[1:] != h_s[:-1])
+    before = np.cumsum(c_s) - c_s
+    before -= np.maximum.accumulate(np.where(new_group, before, 0))
+    f = np.empty_like(ci)
+    f[order] = np.clip(n_s - before, 0, c_s)
+    f[loop] = 0
+
+    e_cap[fwd] = (ci - f) / scale
+    e_cap[rev] = f / scale
+    if not isinstance(flow.e_cap, np.ndarray):
+        flow.e_cap = e_cap.tolist()
+    return float(res.flow_value) / scale
 
 
 # ==========================
@@ -203,14 +406,12 @@ class LowerBoundFlowSolver:
         # --- Node id mapping
         base_nodes = self._all_graph_nodes()
         self.name2id = {name: i for i, name in enumerate(base_nodes)}
-        self.id2name = {i: name for name, i in self.name2id.items()}
+        self.id2name: List[str] = base_nodes + ["SS", "TT"]  # dense ids 0..n-1
 
         # --- Flow graph with SS/TT
         self.flow = Dinic(n=len(base_nodes) + 2, eps=self.EPS)
         self.SS = len(base_nodes)
         self.TT = len(base_nodes) + 1
-        self.id2name[self.SS] = "SS"
-        self.id2name[self.TT] = "TT"
 
         # --- Node-cap arcs (v_in -> v_out)
         self.cap_arc_handle: Dict[str, Tuple[int, int]] = {}
@@ -221,19 +422,26 @@ class LowerBoundFlowSolver:
             self.cap_arc_handle[v] = h
 
         # --- Balances due to lower bounds (including circulation trick)
-        self.balance: Dict[int, float] = {i: 0.0 for i in range(len(base_nodes))}
+        self.balance = np.zeros(len(base_nodes), dtype=np.float64)
         self.edge_map = []
         self.forward_handles = []
 
+        # Resolve endpoints and bounds for all edges in one pass
+        # Deterministic order by (u, v, name): build keys once, sort an index permutation
+        keys = [(e.u, e.v, e.name or "") for e in self.P.edges]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        sorted_edges = [self.P.edges[i] for i in order]
+        m = len(sorted_edges)
+        u_ids = np.fromiter((self.name2id[self._to_final_name(e.u, as_src=True)] for e in sorted_edges),
+                            dtype=np.int32, count=m)
+        v_ids = np.fromiter((self.name2id[self._to_final_name(e.v, as_src=False)] for e in sorted_edges),
+                            dtype=np.int32, count=m)
+        los = np.fromiter((e.lo for e in sorted_edges), dtype=np.float64, count=m)
+        his = np.fromiter((e.hi for e in sorted_edges), dtype=np.float64, count=m)
+
         # Original edges: add (hi-lo) and do balances: b[u]-=lo, b[v]+=lo
-        for e in sorted(self.P.edges, key=edge_sort_key):
-            u_final = self._to_final_name(e.u, as_src=True)
-            v_final = self._to_final_name(e.v, as_src=False)
-            u_id = self.name2id[u_final]
-            v_id = self.name2id[v_final]
-
-            lo = e.lo
-            hi = e.hi
+        for e, u_id, v_id, lo, hi in zip(sorted_edges, u_ids.tolist(), v_ids.tolist(),
+                                         los.tolist(), his.tolist()):
             assert hi + self.EPS >= lo, f"Edge {e.name} has hi < lo"
 
             cap = max(0.0, hi - lo)
@@ -250,8 +458,9 @@ class LowerBoundFlowSolver:
                 "handle": h
             })
 
-            self.balance[u_id] -= lo
-            self.balance[v_id] += lo
+        # Interleave (u, -lo), (v, +lo) so balances accumulate in edge order
+        np.add.at(self.balance, np.column_stack((u_ids, v_ids)).ravel(),
+                  np.column_stack((-los, los)).ravel())
 
         # --- Single source + circulation trick (add implicit edge sink->source with [S,S] via balances)
         assert len(self.P.sources) == 1, "This solver expects exactly one source."
@@ -266,18 +475,30 @@ class LowerBoundFlowSolver:
 
         # --- Hook SS/TT to satisfy balances
         self.required = 0.0
-        for node_id, b in self.balance.items():
-            if b > self.EPS:
-                self.flow.add_edge(self.SS, node_id, b)
-                self.required += b
-            elif b < -self.EPS:
-                self.flow.add_edge(node_id, self.TT, -b)
-
-    def solve(self) -> dict:
+        for node_id in np.flatnonzero(self.balance > self.EPS).tolist():
+            b = float(self.balance[node_id])
+            self.flow.add_edge(self.SS, node_id, b)
+            self.required += b
+        for node_id in np.flatnonzero(self.balance < -self.EPS).tolist():
+            self.flow.add_edge(node_id, self.TT, -float(self.balance[node_id]))
+
+        self.flow.finalize()
+
+    def solve(self, certificate: bool = True) -> dict:
         self.build_transformed()
-        pushed = self.flow.max_flow(self.SS, self.TT)
+        pushed = None
+        if self.flow.num_arcs >= SCIPY_MIN_ARCS:
+            pushed = scipy_max_flow(self.flow, self.SS, self.TT)
+        if pushed is None:
+            pushed = self.flow.max_flow(self.SS, self.TT)
         if pushed + 1e-12 >= self.required - self.EPS:
             return self._success_output()
+        if not certificate:
+            # Feasibility-only callers: skip the residual BFS and cut scan
+            return {
+                "status": "infeasible",
+                "deficit": {"demand_balance": max(0.0, self.required - pushed)}
+            }
         return self._infeasible_certificate(total=pushed)
 
     def _success_output(self) -> dict:
@@ -310,22 +531,17 @@ class LowerBoundFlowSolver:
         R = self.flow.residual_reachable_from(self.SS)
 
         # Nodes on the source side of min-cut (coalesced)
-        cut_nodes = set()
-        for vid in R:
-            nm = self.id2name.get(vid, "")
-            if nm in ("SS", "TT"):
-                continue
-            cut_nodes.add(base_name(nm))
+        cut_nodes = {base_name(self.id2name[vid]) for vid in np.flatnonzero(R[:self.SS]).tolist()}
 
         # Tight edges crossing the cut (reachable -> unreachable) that are saturated
         tight_edges = []
         seen_pairs = set()
         for meta in self.edge_map:
             u = meta["u_final"]; v = meta["v_final"]
-            u_in_R = (u in R); v_in_R = (v in R)
+            u_in_R = bool(R[u]); v_in_R = bool(R[v])
             if u_in_R and not v_in_R:
                 fr_id, idx = meta["handle"]
-                residual = self.flow.g[fr_id][idx].cap
+                residual = self.flow.e_cap[idx]
                 if residual <= self.EPS:
                     key = (meta["orig_u"], meta["orig_v"])
                     if key not in seen_pairs:
@@ -341,9 +557,9 @@ class LowerBoundFlowSolver:
         for v, h in self.cap_arc_handle.items():
             fr_id, idx = h
             u = fr_id
-            w = self.flow.g[fr_id][idx].to
-            u_in_R = (u in R); w_in_R = (w in R)
-            residual = self.flow.g[fr_id][idx].cap
+            w = int(self.flow.e_to[idx])
+            u_in_R = bool(R[u]); w_in_R = bool(R[w])
+            residual = self.flow.e_cap[idx]
             if u_in_R and not w_in_R and residual <= self.EPS:
                 tight_nodes.append(v)
 
@@ -369,24 +585,55 @@ class LowerBoundFlowSolver:
 # Public API
 # ==========================
 
-def solve_lower_bounded_flow(input_json: dict) -> dict:
+def solve_lower_bounded_flow(input_json: dict, certificate: bool = True) -> dict:
     prob = parse_input_json(input_json)
     solver = LowerBoundFlowSolver(prob)
-    return solver.solve()
+    return solver.solve(certificate=certificate)
 
 # ==========================
 # CLI
 # ==========================
 
-def _read_stdin_json():
-    raw = sys.stdin.read()
+def _parse_json(raw):
+    # orjson rejects the Infinity/NaN literals json.loads accepts; fall back so the
+    # accepted input does not depend on whether orjson is installed
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
     return json.loads(raw)
 
+def _read_stdin_json():
+    return _parse_json(sys.stdin.buffer.read())
+
 def _write_stdout_json(obj):
+    if orjson is not None:
+        sys.stdout.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode("utf-8"))
+        return
     sys.stdout.write(json.dumps(obj, indent=2, ensure_ascii=False))
 
+def serve():
+    """Line-delimited JSON: one request per stdin line, one response per stdout line."""
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        out = solve_lower_bounded_flow(_parse_json(line))
+        if orjson is not None:
+            sys.stdout.write(orjson.dumps(out, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8") + "\n")
+        else:
+            sys.stdout.write(json.dumps(out, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
 def main():
+    if "--serve" in sys.argv[1:]:
+        serve()
+        return
     data = _read_stdin_json()
+    if "--batch" in sys.argv[1:]:
+        # JSON array of requests in, JSON array of responses (same order) out
+        _write_stdout_json([solve_lower_bounded_flow(d) for d in data])
+        return
     out = solve_lower_bounded_flow(data)
     _write_stdout_json(out)
 
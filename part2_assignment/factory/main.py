@@ -1,12 +1,40 @@
-import json, math, sys
-from typing import Dict, List, Tuple
+import json, sys
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import numpy as np
 
+if TYPE_CHECKING:  # scipy is imported lazily, only for systems too large for the dense path
+    from scipy.sparse import csc_matrix
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the CLI then uses the stdlib json module
+    orjson = None
+
 EPS = 1e-9
 
+# Up to this many unknowns (R + |raws|) the LP is solved densely in numpy; larger
+# systems go to HiGHS, whose scipy import alone costs more than a small solve.
+DENSE_LP_MAX_VARS = 100
+
+def parse_json(raw):
+    # orjson rejects the Infinity/NaN literals json.loads accepts; fall back so the
+    # accepted input does not depend on whether orjson is installed
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
 def read_stdin_json():
-    data = sys.stdin.read()
-    return json.loads(data)
+    return parse_json(sys.stdin.buffer.read())
+
+def write_stdout_json(obj):
+    if orjson is not None:
+        opts = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        sys.stdout.write(orjson.dumps(obj, option=opts).decode("utf-8") + "\n")
+        return
+    print(json.dumps(obj, indent=2, sort_keys=True))
 
 def pick_recipes_dict(input_data: dict) -> Dict:
     # Accept both "recipes" and the misspelled "recipies"
@@ -54,22 +82,34 @@ def build_recipe_order(recipes: Dict) -> List[str]:
 def build_item_index(items: List[str]) -> Dict[str, int]:
     return {name: idx for idx, name in enumerate(items)}
 
-def build_stoich_matrix(recipes: Dict,
-                        recipe_names: List[str],
-                        items: List[str],
-                        item_index: Dict[str, int],
-                        prod_mult: Dict[str, float]) -> np.ndarray:
-    I = len(items)
-    R = len(recipe_names)
-    S = np.zeros((I, R), dtype=float)
+def flatten_recipes(recipes: Dict,
+                    recipe_names: List[str],
+                    item_index: Dict[str, int]) -> Tuple[np.ndarray, ...]:
+    """
+    One pass over the nested recipe dicts into flat SoA arrays:
+    (in_ri, in_ii, in_qty, out_ri, out_ii, out_qty) = recipe index, item index, quantity.
+    """
+    in_ri: List[int] = []; in_ii: List[int] = []; in_qty: List[float] = []
+    out_ri: List[int] = []; out_ii: List[int] = []; out_qty: List[float] = []
     for j, rname in enumerate(recipe_names):
         r = recipes[rname]
-        m = r["machine"]
-        pm = float(prod_mult[m])
         for i_name, v in r.get("in", {}).items():
-            S[item_index[i_name], j] -= float(v)
+            in_ri.append(j); in_ii.append(item_index[i_name]); in_qty.append(float(v))
         for i_name, v in r.get("out", {}).items():
-            S[item_index[i_name], j] += float(v) * pm  # productivity multiplies outputs only
+            out_ri.append(j); out_ii.append(item_index[i_name]); out_qty.append(float(v))
+    return (np.asarray(in_ri, dtype=np.intp), np.asarray(in_ii, dtype=np.intp),
+            np.asarray(in_qty, dtype=np.float64),
+            np.asarray(out_ri, dtype=np.intp), np.asarray(out_ii, dtype=np.intp),
+            np.asarray(out_qty, dtype=np.float64))
+
+def build_stoich_matrix(items: List[str],
+                        recipe_names: List[str],
+                        flat: Tuple[np.ndarray, ...],
+                        pm_arr: np.ndarray) -> np.ndarray:
+    in_ri, in_ii, in_qty, out_ri, out_ii, out_qty = flat
+    S = np.zeros((len(items), len(recipe_names)), dtype=float)
+    np.add.at(S, (in_ii, in_ri), -in_qty)
+    np.add.at(S, (out_ii, out_ri), out_qty * pm_arr[out_ri])  # productivity multiplies outputs only
     return S
 
 def split_items(items: List[str],
@@ -94,57 +134,50 @@ def assemble_equalities(S: np.ndarray,
                         raws: List[str],
                         intermediates: List[str],
                         target_item: str,
-                        target_rate: float) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+                        target_rate: float,
+                        dense: bool = False) -> Tuple["np.ndarray | csc_matrix", np.ndarray, Dict[str, int]]:
     """
     Build Aeq * y = beq, with y = [x (R vars); u_raw (|raws| vars)].
+    Aeq is returned as a sparse CSC matrix (a few nonzeros per column), or as a
+    dense array when dense is set.
     For intermediates: S_i * x = 0
     For target:        S_t * x = target_rate
     For raws:          S_i * x + u_i = 0
     """
-    Irows = []
-    grows = []  # row RHS
-    # intermediates
-    for i_name in intermediates:
-        i = item_index[i_name]
-        Irows.append((i, "intermediate"))
-        grows.append(0.0)
-    # target
-    t = item_index[target_item]
-    Irows.append((t, "target"))
-    grows.append(float(target_rate))
-    # raws
-    for i_name in raws:
-        i = item_index[i_name]
-        Irows.append((i, "raw"))
-        grows.append(0.0)
-
-    beq = np.array(grows, dtype=float)
-    num_rows = len(Irows)
+    row_items = ([item_index[i] for i in intermediates] + [item_index[target_item]]
+                 + [item_index[i] for i in raws])
+    beq = np.zeros(len(row_items), dtype=float)
+    beq[len(intermediates)] = float(target_rate)
+    num_rows = len(row_items)
     R = S.shape[1]
     U = len(raws)
-    Aeq = np.zeros((num_rows, R + U), dtype=float)
-
-    # Fill recipe part
-    for row_idx, (i, kind) in enumerate(Irows):
-        Aeq[row_idx, :R] = S[i, :]
-    # Fill raw-draw columns (identity on raw rows)
     raw_col_index = {raws[k]: k for k in range(U)}
-    for row_idx, (i, kind) in enumerate(Irows):
-        if kind == "raw":
-            raw_name = items[i]
-            col = R + raw_col_index[raw_name]
-            Aeq[row_idx, col] = 1.0
+
+    # Nonzeros of the selected S rows; raw rows also get +1 on their draw column
+    S_rows = S[row_items]
+    rows, cols = np.nonzero(S_rows)
+    data = S_rows[rows, cols]
+    raw_rows = np.arange(num_rows - U, num_rows)
+    rows = np.concatenate([rows, raw_rows])
+    cols = np.concatenate([cols, R + np.arange(U)])
+    data = np.concatenate([data, np.ones(U)])
+    if dense:
+        Aeq = np.zeros((num_rows, R + U))
+        Aeq[rows, cols] = data
+    else:
+        from scipy.sparse import csc_matrix
+        Aeq = csc_matrix((data, (rows, cols)), shape=(num_rows, R + U), dtype=float)
 
     return Aeq, beq, raw_col_index
 
-def solve_nonnegative_equalities(Aeq: np.ndarray,
-                                 beq: np.ndarray,
-                                 R: int,
-                                 U: int,
-                                 max_iters: int = 20,
-                                 tol: float = 1e-9) -> Tuple[np.ndarray, bool]:
+def projected_least_squares(Aeq: np.ndarray,
+                            beq: np.ndarray,
+                            R: int,
+                            U: int,
+                            max_iters: int = 20,
+                            tol: float = 1e-9) -> Tuple[np.ndarray, bool]:
     """
-    Very small active-set-like refinement:
+    Fallback used when NNLS raises. Very small active-set-like refinement:
     1) Start with unconstrained least-squares.
     2) Project negatives to zero.
     3) Re-solve on the positive set a few times.
@@ -156,20 +189,22 @@ def solve_nonnegative_equalities(Aeq: np.ndarray,
     except np.linalg.LinAlgError:
         return np.zeros(R + U), False
 
-    y = np.maximum(0.0, y)
+    np.maximum(y, 0.0, out=y)
+    # Two buffers swapped each iteration; clipping is done in place
+    y_new = np.empty_like(y)
 
     for _ in range(max_iters):
         active = y > 0
         if not np.any(active):
             # Try full LS again (not expected often)
             try:
-                y_new = np.linalg.lstsq(Aeq, beq, rcond=None)[0]
+                y_new[:] = np.linalg.lstsq(Aeq, beq, rcond=None)[0]
             except np.linalg.LinAlgError:
                 return y, False
-            y_new = np.maximum(0.0, y_new)
+            np.maximum(y_new, 0.0, out=y_new)
             if np.linalg.norm(y_new - y, ord=np.inf) < 1e-12:
                 break
-            y = y_new
+            y, y_new = y_new, y
             continue
 
         # Solve exactly for active set (inactive vars fixed to 0)
@@ -179,9 +214,9 @@ def solve_nonnegative_equalities(Aeq: np.ndarray,
         except np.linalg.LinAlgError:
             return y, False
 
-        y_new = np.zeros_like(y)
+        y_new.fill(0.0)
         y_new[active] = y_act
-        y_new = np.maximum(0.0, y_new)
+        np.maximum(y_new, 0.0, out=y_new)
 
         # Check residual
         r = Aeq @ y_new - beq
@@ -193,31 +228,246 @@ def solve_nonnegative_equalities(Aeq: np.ndarray,
             # Stuck; exit loop and check residual outside
             y = y_new
             break
-        y = y_new
+        y, y_new = y_new, y
 
     # Final residual check
     r = Aeq @ y - beq
     ok = np.linalg.norm(r, ord=np.inf) <= tol
     return y, ok
 
-def compute_machine_usage(recipes: Dict,
-                          recipe_names: List[str],
-                          x: np.ndarray,
-                          craft_speed: Dict[str, float]) -> Dict[str, float]:
-    per_machine_usage = {}
-    for mname in craft_speed.keys():
-        per_machine_usage[mname] = 0.0
-    for j, rname in enumerate(recipe_names):
-        r = recipes[rname]
-        m = r["machine"]
-        eff = eff_crafts_per_min_for_recipe(r, craft_speed)
-        if eff <= EPS:
-            return {}  # invalid recipe speed; will be caught as infeasible
-        per_machine_usage[m] += x[j] / eff
-    return per_machine_usage
+def nonnegative_least_squares(Aeq: np.ndarray,
+                              beq: np.ndarray,
+                              R: int,
+                              U: int,
+                              max_iters: int = 20,
+                              tol: float = 1e-9) -> Tuple[np.ndarray, bool]:
+    """
+    Dense fallback: scipy's active-set NNLS, then projected least-squares if NNLS raises.
+    Success means the residual norm is within tol (relative to |beq|).
+    """
+    from scipy.optimize import nnls
+    try:
+        y, rnorm = nnls(Aeq, beq, maxiter=10 * (R + U))
+    except (RuntimeError, ValueError):
+        return projected_least_squares(Aeq, beq, R, U, max_iters=max_iters, tol=tol)
+    return y, bool(rnorm <= tol * max(1.0, float(np.linalg.norm(beq))))
+
+def inequalities_as_equalities(Aeq: np.ndarray,
+                               beq: np.ndarray,
+                               A_ub: np.ndarray = None,
+                               b_ub: np.ndarray = None,
+                               upper: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dense [Aeq; A_ub | 0, I] system with one slack column per inequality row, so a
+    solver that only knows y >= 0 and equalities still respects A_ub * y <= b_ub and
+    y <= upper (finite entries). The first Aeq.shape[1] columns of a solution are y.
+    """
+    n = Aeq.shape[1]
+    rows = [] if A_ub is None else [np.asarray(A_ub, dtype=float)]
+    rhs = [] if b_ub is None else [np.asarray(b_ub, dtype=float)]
+    if upper is not None:
+        capped = np.flatnonzero(np.isfinite(upper))
+        bound_rows = np.zeros((len(capped), n))
+        bound_rows[np.arange(len(capped)), capped] = 1.0
+        rows.append(bound_rows)
+        rhs.append(np.asarray(upper, dtype=float)[capped])
+    if not rows:
+        return Aeq, beq
+    A_in = np.vstack(rows)
+    k = A_in.shape[0]
+    A = np.block([[Aeq, np.zeros((Aeq.shape[0], k))],
+                  [A_in, np.eye(k)]])
+    return A, np.concatenate([beq, *rhs])
+
+def _pivot(T: np.ndarray, basis: List[int], r: int, j: int):
+    T[r] /= T[r, j]
+    col = T[:, j].copy()
+    col[r] = 0.0
+    T -= np.outer(col, T[r])
+    basis[r] = j
+
+def _simplex_phase(T: np.ndarray, basis: List[int], ncols: int, tol: float, max_pivots: int) -> int:
+    """
+    Pivot tableau T (last row: reduced costs, last column: RHS) to optimality over
+    its first ncols columns, with Bland's rule so degenerate pivots cannot cycle.
+    Returns 0 optimal, 1 pivot limit, 3 unbounded.
+    """
+    m = T.shape[0] - 1
+    for _ in range(max_pivots):
+        entering = np.flatnonzero(T[m, :ncols] < -tol)
+        if entering.size == 0:
+            return 0
+        j = int(entering[0])
+        rows = np.flatnonzero(T[:m, j] > tol)
+        if rows.size == 0:
+            return 3
+        ratios = T[rows, -1] / T[rows, j]
+        ties = rows[ratios <= ratios.min() + tol]
+        r = int(min(ties, key=basis.__getitem__))
+        _pivot(T, basis, r, j)
+    return 1
+
+def dense_simplex(c: np.ndarray,
+                  A: np.ndarray,
+                  b: np.ndarray,
+                  tol: float = 1e-9) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Two-phase tableau simplex for min c*z subject to A*z = b, z >= 0 on small dense systems.
+    Returns (z, status) with status 0 optimal, 1 pivot limit, 2 infeasible, 3 unbounded;
+    z is None unless status is 0.
+    """
+    m, n = A.shape
+    sign = np.where(b < 0, -1.0, 1.0)
+    # Phase 1: one artificial per row, minimise their sum
+    T = np.zeros((m + 1, n + m + 1))
+    T[:m, :n] = A * sign[:, None]
+    T[:m, n:n + m] = np.eye(m)
+    T[:m, -1] = b * sign
+    T[m] = -T[:m].sum(axis=0)
+    T[m, n:n + m] = 0.0
+    basis = list(range(n, n + m))
+    max_pivots = 50 * (n + m)
+    status = _simplex_phase(T, basis, n + m, tol, max_pivots)
+    if status != 0:
+        return None, status
+    if -T[m, -1] > tol * max(1.0, float(np.abs(b).sum())):
+        return None, 2
+    # Pivot leftover (zero-valued) artificials out; rows where that is impossible are redundant
+    keep = []
+    for r in range(m):
+        if basis[r] >= n:
+            cand = np.flatnonzero(np.abs(T[r, :n]) > tol)
+            if cand.size == 0:
+                continue
+            _pivot(T, basis, r, int(cand[0]))
+        keep.append(r)
+    T = np.vstack([T[keep][:, list(range(n)) + [-1]], np.zeros((1, n + 1))])
+    basis = [basis[r] for r in keep]
+    # Phase 2: reduced costs of the real objective w.r.t. the feasible basis
+    k = len(keep)
+    T[k, :n] = c
+    for r, j in enumerate(basis):
+        T[k] -= c[j] * T[r]
+    status = _simplex_phase(T, basis, n, tol, max_pivots)
+    if status != 0:
+        return None, status
+    # Read the vertex off the final basis directly; the tableau carries pivoting round-off
+    z = np.zeros(n)
+    try:
+        B, rhs = A[keep][:, basis], b[keep]
+        zb = np.linalg.solve(B, rhs)
+        zb += np.linalg.solve(B, rhs - B @ zb)  # one refinement step
+        z[basis] = zb
+    except np.linalg.LinAlgError:
+        z[basis] = T[:k, -1]
+    np.maximum(z, 0.0, out=z)
+    return z, 0
 
-def ceil_machines(per_machine_usage: Dict[str, float]) -> Dict[str, int]:
-    return {m: int(math.ceil(v - 1e-12)) for m, v in per_machine_usage.items()}  # tiny epsilon to avoid 1.00000000001
+def solve_nonnegative_equalities(Aeq: "np.ndarray | csc_matrix",
+                                 beq: np.ndarray,
+                                 R: int,
+                                 U: int,
+                                 cost: np.ndarray = None,
+                                 A_ub: "np.ndarray | csc_matrix" = None,
+                                 b_ub: np.ndarray = None,
+                                 upper: np.ndarray = None,
+                                 max_iters: int = 20,
+                                 tol: float = 1e-9) -> Tuple[np.ndarray, bool]:
+    """
+    LP: minimise cost * y subject to Aeq * y = beq, A_ub * y <= b_ub and
+    0 <= y <= upper. Dense systems are tried with dense_simplex first; sparse
+    ones (and dense ones it gives up on) go to HiGHS dual simplex.
+    cost defaults to zero (pure feasibility), upper to +inf.
+    Returns y = [x(0..R-1), u(R..R+U-1)], and success flag
+    """
+    n = R + U
+    c = np.zeros(n) if cost is None else cost
+    dense = isinstance(Aeq, np.ndarray)
+    residual_ok = lambda y: (float(np.linalg.norm(Aeq @ y - beq))
+                             <= tol * max(1.0, float(np.linalg.norm(beq))))
+
+    if dense:
+        A, b = inequalities_as_equalities(Aeq, beq, A_ub, b_ub, upper)
+        z, status = dense_simplex(np.concatenate([c, np.zeros(A.shape[1] - n)]), A, b, tol=tol)
+        if status == 0 and residual_ok(z[:n]):
+            return z[:n], True
+        if status == 2:
+            return np.zeros(n), False
+        # Pivot limit / numerical trouble: let HiGHS have a go
+
+    from scipy.optimize import linprog
+    if upper is None:
+        bounds = (0, None)
+    else:
+        bounds = [(0.0, float(hi) if np.isfinite(hi) else None) for hi in upper]
+    res = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=Aeq, b_eq=beq, bounds=bounds, method="highs-ds")
+    if res.status == 0:
+        y = res.x
+        return y, residual_ok(y)
+    if res.status == 2:
+        # HiGHS proved the system infeasible
+        return np.zeros(n), False
+    # Iteration limit / numerical trouble: retry densely, inequalities turned into slack columns
+    A, b = inequalities_as_equalities(Aeq if dense else Aeq.toarray(), beq,
+                                      A_ub if A_ub is None or dense else A_ub.toarray(), b_ub, upper)
+    y, ok = nonnegative_least_squares(A, b, R, U + (A.shape[1] - n), max_iters=max_iters, tol=tol)
+    return y[:n], ok
+
+def recipe_machine_speeds(recipes: Dict,
+                          recipe_names: List[str],
+                          craft_speed: Dict[str, float]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(machine_names, machine index per recipe, effective crafts/min per machine per recipe)."""
+    machine_names = list(craft_speed.keys())
+    m_idx = {m: k for k, m in enumerate(machine_names)}
+    recipe_m = np.fromiter((m_idx[recipes[r]["machine"]] for r in recipe_names),
+                           dtype=np.intp, count=len(recipe_names))
+    eff = np.fromiter((eff_crafts_per_min_for_recipe(recipes[r], craft_speed) for r in recipe_names),
+                      dtype=np.float64, count=len(recipe_names))
+    return machine_names, recipe_m, eff
+
+def machine_cap_rows(machine_names: List[str],
+                     recipe_m: np.ndarray,
+                     eff: np.ndarray,
+                     max_machines: Dict[str, int],
+                     U: int,
+                     dense: bool = False) -> Tuple["np.ndarray | csc_matrix", np.ndarray]:
+    """
+    A_ub * [x; u] <= b_ub with one row per machine type: sum_r x_r/eff(r) <= cap.
+    Counts are ceil(usage), so for an integer cap this is exactly the cap check.
+    """
+    R = len(recipe_m)
+    if dense:
+        A_ub = np.zeros((len(machine_names), R + U))
+        A_ub[recipe_m, np.arange(R)] = 1.0 / eff
+    else:
+        from scipy.sparse import csc_matrix
+        A_ub = csc_matrix((1.0 / eff, (recipe_m, np.arange(R))), shape=(len(machine_names), R + U))
+    b_ub = np.fromiter((float(max_machines.get(m, 0)) for m in machine_names),
+                       dtype=np.float64, count=len(machine_names))
+    return A_ub, b_ub
+
+def compute_machine_counts(recipes: Dict,
+                           recipe_names: List[str],
+                           x: np.ndarray,
+                           craft_speed: Dict[str, float],
+                           max_machines: Dict[str, int]) -> Tuple[Dict[str, float], Dict[str, int], List[str]]:
+    """
+    One array pass over machine types: continuous usage sum_r x_r/eff(r),
+    integer counts (ceil once per type) and "<machine> cap" hints.
+    Returns empty results if some recipe has a non-positive effective speed.
+    """
+    machine_names, recipe_m, eff = recipe_machine_speeds(recipes, recipe_names, craft_speed)
+    if np.any(eff <= EPS):
+        return {}, {}, []  # invalid recipe speed; will be caught as infeasible
+    usage = np.zeros(len(machine_names), dtype=np.float64)
+    np.add.at(usage, recipe_m, x / eff)
+    counts = np.ceil(usage - 1e-12).astype(np.int64)  # tiny epsilon to avoid 1.00000000001
+    caps = np.fromiter((int(max_machines.get(m, 0)) for m in machine_names),
+                       dtype=np.int64, count=len(machine_names))
+    violations = [f"{machine_names[k]} cap" for k in np.flatnonzero(counts > caps)]
+    return (dict(zip(machine_names, usage.tolist())),
+            dict(zip(machine_names, counts.tolist())),
+            violations)
 
 def compute_raw_consumption(raws: List[str],
                             raw_col_index: Dict[str, int],
@@ -229,14 +479,6 @@ def compute_raw_consumption(raws: List[str],
         ans[raw_name] = float(max(0.0, x_and_u[R + col]))
     return ans
 
-def check_caps_integer_machines(machine_counts: Dict[str, int], max_machines: Dict[str, int]) -> List[str]:
-    problems = []
-    for m, used in machine_counts.items():
-        cap = int(max_machines.get(m, 0))
-        if used > cap + 0:
-            problems.append(f"{m} cap")
-    return problems
-
 def check_raw_caps(raw_consumption: Dict[str, float], raw_caps: Dict[str, float]) -> List[str]:
     problems = []
     for item, used in raw_consumption.items():
@@ -251,29 +493,6 @@ def per_recipe_dict(recipe_names: List[str], x: np.ndarray) -> Dict[str, float]:
 def per_machine_counts_dict(machine_counts: Dict[str, int]) -> Dict[str, int]:
     return dict(machine_counts)
 
-def per_recipe_effective_outputs_per_min(recipes, recipe_names, x, prod_mult):
-    # Sum of all outputs (with productivity) per recipe, items/min
-    out = {}
-    for j, rname in enumerate(recipe_names):
-        r = recipes[rname]
-        pm = float(prod_mult[r["machine"]])
-        total = 0.0
-        for item, qty in r.get("out", {}).items():
-            total += float(qty) * pm * float(x[j])
-        out[rname] = total
-    return out
-
-def per_item_outputs_per_min(recipes, recipe_names, x, prod_mult):
-    # Aggregated per-item production (with productivity), items/min
-    acc = {}
-    for j, rname in enumerate(recipe_names):
-        r = recipes[rname]
-        pm = float(prod_mult[r["machine"]])
-        for item, qty in r.get("out", {}).items():
-            acc[item] = acc.get(item, 0.0) + float(qty) * pm * float(x[j])
-    return acc
-
-
 def process_input(input_data: any):
     machines = input_data["machines"]
     recipes = pick_recipes_dict(input_data)
@@ -310,19 +529,13 @@ def make_infeasible_output(hints: List[str]) -> dict:
 
 def make_success_output(per_recipe: Dict[str, float], 
                         per_machine_counts: Dict[str, int], 
-                        raw_consumption: Dict[str, float],
-                        per_recipe_outputs=None, per_item_outputs=None) -> dict:
-    out = {
+                        raw_consumption: Dict[str, float]) -> dict:
+    return {
         "status": "ok",
         "per_recipe_crafts_per_min": per_recipe,
         "per_machine_counts": per_machine_counts,
         "raw_consumption_per_min": raw_consumption
     }
-    if per_recipe_outputs is not None:
-        out["per_recipe_effective_outputs_per_min"] = per_recipe_outputs
-    if per_item_outputs is not None:
-        out["per_item_outputs_per_min"] = per_item_outputs
-    return out
 
 
 def check_feasibility(target_item: str,
@@ -340,16 +553,22 @@ def check_feasibility(target_item: str,
     items = items_from_recipes(recipes, raw_supply_max_per_min, target_item)
     recipe_names = build_recipe_order(recipes)
     item_index = build_item_index(items)
+    flat = flatten_recipes(recipes, recipe_names, item_index)
+
+    # Per-recipe productivity multiplier, looked up once in recipe order
+    pm_arr = np.fromiter((machine_output_multiplier[recipes[r]["machine"]] for r in recipe_names),
+                         dtype=np.float64, count=len(recipe_names))
 
     # Build S (with productivity on outputs)
-    # (We reuse machine_output_multiplier through prod_mult input here)
-    prod_mult = machine_output_multiplier
-    S = build_stoich_matrix(recipes, recipe_names, items, item_index, prod_mult)
+    S = build_stoich_matrix(items, recipe_names, flat, pm_arr)
 
     # Split into raws / intermediates / target
     raws, intermediates, _target_list = split_items(items, raw_supply_max_per_min, target_item)
 
     # Equalities: Aeq * [x; u] = beq
+    R = len(recipe_names)
+    U = len(raws)
+    dense = R + U <= DENSE_LP_MAX_VARS
     Aeq, beq, raw_col_index = assemble_equalities(
         S=S,
         items=items,
@@ -357,13 +576,24 @@ def check_feasibility(target_item: str,
         raws=raws,
         intermediates=intermediates,
         target_item=target_item,
-        target_rate=target_rate_per_min
+        target_rate=target_rate_per_min,
+        dense=dense
     )
-    R = len(recipe_names)
-    U = len(raws)
 
-    # Solve for a nonnegative steady-state
-    y, ok = solve_nonnegative_equalities(Aeq, beq, R, U, max_iters=30, tol=1e-9)
+    # Cheapest steady state within the limits: minimise total raw draw, with raw
+    # supply caps as upper bounds on u and machine caps as usage rows
+    cost = np.concatenate([np.zeros(R), np.ones(U)])
+    upper = np.concatenate([np.full(R, np.inf),
+                            np.fromiter((raw_supply_max_per_min[r] for r in raws), dtype=np.float64, count=U)])
+    machine_names, recipe_m, eff = recipe_machine_speeds(recipes, recipe_names, machine_crafts_per_min)
+    A_ub = b_ub = None
+    if not np.any(eff <= EPS):  # otherwise reported as an invalid speed below
+        A_ub, b_ub = machine_cap_rows(machine_names, recipe_m, eff, max_machines, U, dense=dense)
+    y, ok = solve_nonnegative_equalities(Aeq, beq, R, U, cost=cost, A_ub=A_ub, b_ub=b_ub, upper=upper,
+                                         max_iters=30, tol=1e-9)
+    if not ok:
+        # Nothing fits the limits; solve without them so the checks below name the binding one
+        y, ok = solve_nonnegative_equalities(Aeq, beq, R, U, cost=cost, max_iters=30, tol=1e-9)
     if not ok:
         return make_infeasible_output(["steady-state balance infeasible"])
 
@@ -389,19 +619,16 @@ def check_feasibility(target_item: str,
         return make_infeasible_output(raw_cap_hints)
 
     # Machine usage and integer rounding
-    per_machine_usage = compute_machine_usage(recipes, recipe_names, x, machine_crafts_per_min)
+    per_machine_usage, per_machine_counts_int, mach_hints = compute_machine_counts(
+        recipes, recipe_names, x, machine_crafts_per_min, max_machines)
     if not per_machine_usage:
         return make_infeasible_output(["invalid machine/recipe speed"])
-    per_machine_counts_int = ceil_machines(per_machine_usage)
-    mach_hints = check_caps_integer_machines(per_machine_counts_int, max_machines)
     if mach_hints:
         return make_infeasible_output(mach_hints)
 
     # Success: format outputs
     per_recipe = per_recipe_dict(recipe_names, x)
     per_machine_counts = per_machine_counts_dict(per_machine_counts_int)
-    per_recipe_outputs = per_recipe_effective_outputs_per_min(recipes, recipe_names, x, machine_output_multiplier)
-    per_item_outputs = per_item_outputs_per_min(recipes, recipe_names, x, machine_output_multiplier)
 
     return make_success_output(
         per_recipe=per_recipe,
@@ -409,13 +636,12 @@ def check_feasibility(target_item: str,
         raw_consumption=raw_consumption
     )
 
-def main():
-    input_data = read_stdin_json()
+def solve_factory(input_data: dict) -> dict:
     target_item, target_rate_per_min, recipes, craft_speed, prod_mult, max_machines, raw_caps = process_input(input_data)
 
     # For clarity: machine_crafts_per_min holds speed-adjusted base (no time_s), prod_mult holds (1+prod)
     # The feasibility routine expects these two dicts.
-    result = check_feasibility(
+    return check_feasibility(
         target_item=target_item,
         target_rate_per_min=target_rate_per_min,
         recipes=recipes,
@@ -424,7 +650,30 @@ def main():
         machine_output_multiplier=prod_mult,
         max_machines=max_machines
     )
-    print(json.dumps(result, indent=2, sort_keys=True))
+
+def serve():
+    # Line-delimited JSON: one request per stdin line, one response per stdout line
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        result = solve_factory(parse_json(line))
+        if orjson is not None:
+            opts = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            sys.stdout.write(orjson.dumps(result, option=opts).decode("utf-8") + "\n")
+        else:
+            sys.stdout.write(json.dumps(result, sort_keys=True) + "\n")
+        sys.stdout.flush()
+
+def main():
+    if "--serve" in sys.argv[1:]:
+        serve()
+        return
+    input_data = read_stdin_json()
+    if "--batch" in sys.argv[1:]:
+        # JSON array of requests in, JSON array of responses (same order) out
+        write_stdout_json([solve_factory(d) for d in input_data])
+        return
+    write_stdout_json(solve_factory(input_data))
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,55 @@
 #!/usr/bin/env python3
-import sys
+import os
 import subprocess
+import sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent
+TESTS_DIR = ROOT / "tests"
+
+def discover():
+    # One directory read for every test file present, instead of a stat per path.
+    with os.scandir(TESTS_DIR) as it:
+        return {e.name for e in it
+                if e.name.startswith("test_") and e.name.endswith(".py") and e.is_file()}
+
+def run_shard(shard, missing):
+    # Missing files are never handed to pytest; a shard with nothing left spawns nothing.
+    present = [name for name in shard if name not in missing]
+    if not present:
+        return None
+    return subprocess.Popen(
+        [sys.executable, "-m", "pytest", "-q", "-x", *(str(TESTS_DIR / name) for name in present)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        # No cwd= and no close_fds: that keeps subprocess on its posix_spawn path
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))},
+        close_fds=False,
+    )
 
 def main():
-    # Run pytest directly on the two files we maintain.
-    cmd = [sys.executable, "-m", "pytest", "-q", "tests/test_belts.py", "tests/test_factory.py"]
-    proc = subprocess.run(cmd, cwd=str(ROOT))
-    sys.exit(proc.returncode)
+    # Optional arguments pick test files (by path or name); default is every tests/test_*.py.
+    found = discover()
+    tests = sorted(Path(a).name for a in sys.argv[1:]) or sorted(found)
+    missing = set(tests) - found
+    for name in sorted(missing):
+        print(f"MISSING: tests/{name}")
+
+    # Whole-folder run: split the test files evenly over cpu_count()-2 pytest processes.
+    n = max(1, (os.cpu_count() or 1) - 2)
+    shards = [shard for shard in (tests[i::n] for i in range(n)) if shard]
+    procs = [run_shard(shard, missing) for shard in shards]
+    ok = not missing
+    for shard, p in zip(shards, procs):
+        if p is None:
+            continue
+        out, err = p.communicate()
+        print(f"=== {' '.join(name for name in shard if name not in missing)} (exit {p.returncode}) ===")
+        sys.stdout.write(out)
+        sys.stderr.write(err)
+        ok = ok and p.returncode == 0
+    sys.exit(0 if ok else 1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,50 @@
+# JSON parsing and comparison shared by conftest and the test modules. A plain
+# module rather than conftest so it imports the same under every --import-mode.
+
+import json
+import math
+
+try:
+    import orjson
+
+    def loads(raw):
+        # orjson rejects the Infinity/NaN literals the solvers accept via json.loads
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:  # subclasses json.JSONDecodeError
+            return json.loads(raw)
+
+    def canonical(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    loads = json.loads
+
+    def canonical(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+_EXPECTED_CANONICAL: dict = {}
+
+def assert_json_eq(actual_obj, expected_str: str, case_id: str = "case"):
+    """Compare actual against expected as canonical (sorted-key) JSON bytes."""
+    e = _EXPECTED_CANONICAL.get(expected_str)
+    if e is None:
+        e = _EXPECTED_CANONICAL[expected_str] = canonical(loads(expected_str))
+    a = canonical(actual_obj)
+    assert a == e, (f"\n[{case_id}] Expected:\n{json.dumps(loads(e), indent=2)}"
+                    f"\nActual:\n{json.dumps(actual_obj, indent=2)}")
+
+def assert_json_close(actual_obj, expected_str: str, case_id: str = "case",
+                      rel: float = 1e-9, abs: float = 1e-9):
+    """Compare actual against expected structurally, floats to within rel/abs."""
+    def close(a, e) -> bool:
+        if isinstance(e, dict):
+            return isinstance(a, dict) and a.keys() == e.keys() and all(close(a[k], e[k]) for k in e)
+        if isinstance(e, list):
+            return isinstance(a, list) and len(a) == len(e) and all(map(close, a, e))
+        if isinstance(e, float) and isinstance(a, (int, float)) and not isinstance(a, bool):
+            return math.isclose(a, e, rel_tol=rel, abs_tol=abs)
+        return type(a) is type(e) and a == e
+
+    expected = loads(expected_str)
+    assert close(actual_obj, expected), (f"\n[{case_id}] Expected (rel={rel}, abs={abs}):\n{json.dumps(expected, indent=2)}"
+                                         f"\nActual:\n{json.dumps(actual_obj, indent=2)}")
@@ -0,0 +1,235 @@
+# Shared fixtures: each CLI solves all of a module's cases in one --batch run.
+
+import contextlib
+import copy
+import functools
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import pickle
+import py_compile
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from _json_helpers import loads
+
+try:
+    import fcntl
+except ImportError:  # POSIX only; on Windows saves merge without the lock
+    fcntl = None
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ("belts/main.py", "factory/main.py")
+
+# Memoization of CLI runs: results are keyed by (runner, interpreter, script, sha1
+# of stdin, script mtime, solver dependencies), kept in-process and persisted under
+# .pytest_cache/ so reruns skip the subprocess until the script or one of its
+# dependencies changes.
+CACHE_FILE = ROOT / ".pytest_cache" / "cli_results.pkl"
+
+# The solvers pick code paths by which optional packages import, so a cached
+# result is only valid for the same set of installed versions.
+SOLVER_DEPS = ("numpy", "scipy", "numba", "orjson")
+
+def _dep_versions() -> tuple:
+    versions = []
+    for name in SOLVER_DEPS:
+        version = None
+        if importlib.util.find_spec(name) is not None:
+            try:
+                version = importlib.metadata.version(name)
+            except importlib.metadata.PackageNotFoundError:
+                version = "unknown"
+        versions.append((name, version))
+    return tuple(versions)
+
+_DEPS_KEY = _dep_versions()
+
+_CLI_CACHE: dict = {}
+_loaded = False
+
+def _read_cache_file() -> dict:
+    try:
+        with open(CACHE_FILE, "rb") as fh:
+            return pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+def _load() -> dict:
+    global _loaded
+    if not _loaded:
+        _loaded = True
+        _CLI_CACHE.update(_read_cache_file())
+    return _CLI_CACHE
+
+@contextlib.contextmanager
+def _save_lock():
+    if fcntl is None:
+        yield
+        return
+    with open(CACHE_FILE.with_suffix(".lock"), "wb") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+def _save():
+    # xdist workers and run_samples.py shards save concurrently: merge whatever
+    # the others have written since _load before replacing the file, under an
+    # exclusive lock where fcntl exists.
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with _save_lock():
+        merged = {**_read_cache_file(), **_CLI_CACHE}
+        tmp = CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump(merged, fh)
+        try:
+            os.replace(tmp, CACHE_FILE)
+        except OSError:  # e.g. Windows while another process reads the file; stay uncached
+            os.unlink(tmp)
+
+def _cli_cache(run_cli):
+    """Wrap run_cli(main_rel_path, stdin_json) with the cache above; str input is encoded to UTF-8 bytes."""
+    @functools.wraps(run_cli)
+    def wrapper(main_rel_path: str, stdin_json):
+        if isinstance(stdin_json, str):
+            stdin_json = stdin_json.encode("utf-8")
+        main = (ROOT / main_rel_path).resolve()
+        key = (run_cli.__name__, sys.executable, main_rel_path,
+               hashlib.sha1(stdin_json).hexdigest(),
+               main.stat().st_mtime, _DEPS_KEY)
+        cache = _load()
+        if key in cache:
+            return copy.deepcopy(cache[key])
+        result = run_cli(main_rel_path, stdin_json)
+        cache[key] = copy.deepcopy(result)
+        _save()
+        return result
+    return wrapper
+
+def _child_env() -> dict:
+    # ROOT goes on PYTHONPATH rather than cwd=: passing cwd rules out posix_spawn.
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_pyc():
+    """Compile the solver sources up front so the --batch subprocesses load cached bytecode."""
+    for rel in SCRIPTS:
+        py_compile.compile(str(ROOT / rel), doraise=True)
+
+def _parse_output(main_rel_path: str, proc: subprocess.CompletedProcess):
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode("utf-8", "replace")
+        raise AssertionError(f"{main_rel_path} failed ({proc.returncode}).\nSTDERR:\n{stderr}")
+    try:
+        return loads(proc.stdout)
+    except json.JSONDecodeError as e:
+        stdout = proc.stdout.decode("utf-8", "replace")
+        raise AssertionError(f"Output was not valid JSON.\nSTDOUT:\n{stdout}") from e
+
+@_cli_cache
+def _run_batch(main_rel_path: str, stdin_json: bytes):
+    # Run as a module: scripts run by path are always recompiled, modules use __pycache__
+    module = main_rel_path[:-len(".py")].replace("/", ".")
+    proc = subprocess.run(
+        [sys.executable, "-m", module, "--batch"],
+        input=stdin_json,
+        capture_output=True,
+        env=_child_env(),
+        close_fds=False,  # with cwd unset this lets subprocess use posix_spawn
+    )
+    return _parse_output(main_rel_path, proc)
+
+@_cli_cache
+def _run_single(main_rel_path: str, stdin_json: bytes):
+    # The documented entry point: python <script> < input.json, result on stdout
+    proc = subprocess.run(
+        [sys.executable, str(ROOT / main_rel_path)],
+        input=stdin_json,
+        capture_output=True,
+        close_fds=False,
+    )
+    return _parse_output(main_rel_path, proc)
+
+class CaseResults(dict):
+    """{case id: result}; a stored exception is raised by the lookup for that case only."""
+    def __getitem__(self, case_id):
+        result = super().__getitem__(case_id)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+def _batch_results(request, main_rel_path: str) -> CaseResults:
+    """
+    Pipe every case of the requesting module's CASES to main_rel_path --batch in
+    one process and return {case id: parsed result}. If the batch fails, each
+    case is rerun on its own so only the cases that fail report an error.
+    """
+    cases = request.module.CASES
+    try:
+        results = _run_batch(main_rel_path, b"[" + b",".join(c["input_bytes"] for c in cases) + b"]")
+        assert len(results) == len(cases), f"{main_rel_path} --batch returned {len(results)} results for {len(cases)} cases"
+        return CaseResults((c["id"], r) for c, r in zip(cases, results))
+    except AssertionError:
+        results = CaseResults()
+        for c in cases:
+            try:
+                results[c["id"]] = _run_single(main_rel_path, c["input_bytes"])
+            except AssertionError as e:
+                results[c["id"]] = e
+        return results
+
+@pytest.fixture(scope="session")
+def run_cli():
+    """run_cli(main_rel_path, stdin_json) -> parsed stdout of python <script> < stdin_json."""
+    return _run_single
+
+@pytest.fixture
+def serve():
+    """
+    serve(main_rel_path) starts main_rel_path --serve and returns send(request),
+    which writes one JSON request line and parses the one response line. The
+    processes are closed at teardown.
+    """
+    procs = []
+
+    def start(main_rel_path: str):
+        module = main_rel_path[:-len(".py")].replace("/", ".")
+        proc = subprocess.Popen(
+            [sys.executable, "-m", module, "--serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=_child_env(),
+            close_fds=False,
+        )
+        procs.append(proc)
+
+        def send(request: bytes):
+            proc.stdin.write(request + b"\n")
+            proc.stdin.flush()
+            line = proc.stdout.readline()
+            assert line, f"{main_rel_path} --serve exited ({proc.wait()}) without a response"
+            return loads(line)
+        return send
+
+    yield start
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait(timeout=5)
+        proc.stdout.close()
+
+# Module scope: CASES lives in the test module. Under -n N --dist loadgroup each
+# module is pinned to one xdist worker (xdist_group), so every batch still runs
+# exactly once per session.
+@pytest.fixture(scope="module")
+def belts_results(request):
+    return _batch_results(request, "belts/main.py")
+
+@pytest.fixture(scope="module")
+def factory_results(request):
+    return _batch_results(request, "factory/main.py")
@@ -1,32 +1,11 @@
 # pytest test: belts
 
 import json
-import subprocess
-import sys
-from pathlib import Path
 import pytest
 
-def run_cli(main_rel_path: str, stdin_json: str):
-    """
-    Run a CLI Python script relative to this file's directory,
-    pass it JSON on stdin, and parse JSON from stdout.
-    """
-    root = Path(__file__).resolve().parent.parent
-    main = (root / main_rel_path).resolve()
+from _json_helpers import assert_json_eq, loads
 
-    proc = subprocess.run(
-        [sys.executable, str(main)],
-        input=stdin_json,
-        text=True,
-        capture_output=True,
-        cwd=str(root),
-    )
-
-    assert proc.returncode == 0, f"Process failed.\nSTDERR:\n{proc.stderr}\nSTDOUT:\n{proc.stdout}"
-    try:
-        return json.loads(proc.stdout)
-    except json.JSONDecodeError as e:
-        raise AssertionError(f"Output was not valid JSON.\nSTDOUT:\n{proc.stdout}") from e
+pytestmark = pytest.mark.xdist_group("belts")
 
 CASES = [
     {
@@ -94,11 +73,153 @@ CASES = [
         }
         """
     },
+    {
+        "id": "fractional_feasible",
+        "input": r"""
+        {
+          "nodes": ["s", "a", "b", "t"],
+          "edges": [
+            {"from": "s", "to": "a", "lo": 0,    "hi": 2.5},
+            {"from": "a", "to": "t", "lo": 0.25, "hi": 1.25},
+            {"from": "a", "to": "b", "lo": 0,    "hi": 1.3},
+            {"from": "b", "to": "t", "lo": 0,    "hi": 0.3333333333}
+          ],
+          "node_caps": { "b": 1.3 },
+          "sources": { "s": 1.5833333333 },
+          "sink": "t"
+        }
+        """,
+        "expected": r"""
+        {
+          "status": "ok",
+          "max_flow_per_min": 1.5833333333,
+          "flows": [
+            {"from": "a", "to": "b", "flow": 0.3333333332999999},
+            {"from": "a", "to": "t", "flow": 1.25},
+            {"from": "b", "to": "t", "flow": 0.3333333332999999},
+            {"from": "s", "to": "a", "flow": 1.5833333333}
+          ]
+        }
+        """
+    },
+    {
+        "id": "fractional_infeasible",
+        "input": r"""
+        {
+          "nodes": ["s", "a", "b", "t"],
+          "edges": [
+            {"from": "s", "to": "a", "lo": 0,    "hi": 2.5},
+            {"from": "a", "to": "t", "lo": 0.25, "hi": 1.25},
+            {"from": "a", "to": "b", "lo": 0,    "hi": 1.3},
+            {"from": "b", "to": "t", "lo": 0,    "hi": 0.45}
+          ],
+          "node_caps": { "b": 1.3 },
+          "sources": { "s": 1.85 },
+          "sink": "t"
+        }
+        """,
+        "expected": r"""
+        {
+          "status": "infeasible",
+          "cut_reachable": ["a", "b", "s"],
+          "deficit": {
+            "demand_balance": 0.15000000000000013,
+            "tight_nodes": [],
+            "tight_edges": [
+              {"from": "a", "to": "t", "flow_needed": 0.07500000000000007},
+              {"from": "b", "to": "t", "flow_needed": 0.07500000000000007}
+            ]
+          }
+        }
+        """
+    },
+    {
+        "id": "parallel_arcs_past_int32",
+        "input": r"""
+        {
+          "nodes": ["s", "a", "t"],
+          "edges": [
+            {"from": "s", "to": "a", "lo": 0, "hi": 100.5},
+            {"from": "a", "to": "t", "lo": 0, "hi": 1500.000001},
+            {"from": "a", "to": "t", "lo": 0, "hi": 1500.000001}
+          ],
+          "sources": { "s": 100.5 },
+          "sink": "t"
+        }
+        """,
+        "expected": r"""
+        {
+          "status": "ok",
+          "max_flow_per_min": 100.5,
+          "flows": [
+            {"from": "a", "to": "t", "flow": 100.5},
+            {"from": "a", "to": "t", "flow": 0.0},
+            {"from": "s", "to": "a", "flow": 100.5}
+          ]
+        }
+        """
+    },
+    {
+        "id": "infinite_capacity",
+        "input": r"""
+        {
+          "edges": [
+            {"from": "s", "to": "t", "lo": 0, "hi": Infinity}
+          ],
+          "sources": { "s": 5 },
+          "sink": "t"
+        }
+        """,
+        "expected": r"""
+        {
+          "status": "ok",
+          "max_flow_per_min": 5.0,
+          "flows": [
+            {"from": "s", "to": "t", "flow": 5.0}
+          ]
+        }
+        """
+    },
 ]
 
+# Fill in ids, minify and UTF-8 encode inputs once, at collection time
+CASES = [{**c,
+          "id": c.get("id", f"case_{i}"),
+          "input_bytes": json.dumps(loads(c["input"]), separators=(",", ":")).encode("utf-8")}
+         for i, c in enumerate(CASES)]
+
+@pytest.mark.parametrize("case", CASES, ids=[c["id"] for c in CASES])
+def test_belts_cases(case, belts_results):
+    assert_json_eq(belts_results[case["id"]], case["expected"], case["id"])
+
+def test_belts_single_input_cli(run_cli):
+    # python belts/main.py < input.json, as documented, rather than --batch
+    case = CASES[0]
+    assert_json_eq(run_cli("belts/main.py", case["input"]), case["expected"], case["id"])
+
+def test_belts_serve(serve):
+    # One --serve process answers every case, one JSON line each way
+    send = serve("belts/main.py")
+    for case in CASES:
+        assert_json_eq(send(case["input_bytes"]), case["expected"], case["id"])
+
+# Small graphs never reach the scipy / numba thresholds; force them to 0 so the
+# large-graph paths (and scipy's fallback to Dinic) solve every case as well.
+@pytest.mark.parametrize("backend", ["scipy", "numba"])
+@pytest.mark.parametrize("case", CASES, ids=[c["id"] for c in CASES])
+def test_belts_cases_large_graph_paths(case, backend, monkeypatch):
+    pytest.importorskip(backend)
+    from belts import main as belts_main
+    monkeypatch.setattr(belts_main, "SCIPY_MIN_ARCS" if backend == "scipy" else "NUMBA_MIN_ARCS", 0)
+    assert_json_eq(belts_main.solve_lower_bounded_flow(loads(case["input"])), case["expected"], case["id"])
 
-@pytest.mark.parametrize("case", CASES, ids=[c.get("id", f"case_{i}") for i, c in enumerate(CASES)])
-def test_belts_cases(case):
-    actual = run_cli("belts/main.py", case["input"])
-    expected = json.loads(case["expected"])
-    assert actual == expected, f"\n[{case.get('id','case')}] Expected:\n{json.dumps(expected,indent=2)}\nActual:\n{json.dumps(actual,indent=2)}"
\ No newline at end of file
+@pytest.mark.parametrize("case", CASES, ids=[c["id"] for c in CASES])
+def test_belts_without_certificate(case):
+    # certificate=False skips the cut: infeasible cases report only demand_balance
+    from belts import main as belts_main
+    expected = loads(case["expected"])
+    if expected["status"] == "infeasible":
+        expected = {"status": "infeasible",
+                    "deficit": {"demand_balance": expected["deficit"]["demand_balance"]}}
+    result = belts_main.solve_lower_bounded_flow(loads(case["input"]), certificate=False)
+    assert_json_eq(result, json.dumps(expected), case["id"])
@@ -1,32 +1,13 @@
 # pytest test: factory
 
 import json
-import subprocess
-import sys
-from pathlib import Path
-import pytest
 
-def run_cli(main_rel_path: str, stdin_json: str):
-    """
-    Run a CLI Python script relative to this file's directory,
-    pass it JSON on stdin, and parse JSON from stdout.
-    """
-    root = Path(__file__).resolve().parent.parent
-    main = (root / main_rel_path).resolve()
+import numpy as np
+import pytest
 
-    proc = subprocess.run(
-        [sys.executable, str(main)],
-        input=stdin_json,
-        text=True,
-        capture_output=True,
-        cwd=str(root),
-    )
+from _json_helpers import assert_json_close, assert_json_eq, loads
 
-    assert proc.returncode == 0, f"Process failed.\nSTDERR:\n{proc.stderr}\nSTDOUT:\n{proc.stdout}"
-    try:
-        return json.loads(proc.stdout)
-    except json.JSONDecodeError as e:
-        raise AssertionError(f"Output was not valid JSON.\nSTDOUT:\n{proc.stdout}") from e
+pytestmark = pytest.mark.xdist_group("factory")
 
 CASES = [
     {
@@ -75,13 +56,13 @@ CASES = [
             "chemical": 5
           },
           "per_recipe_crafts_per_min": {
-            "copper_plate": 4090.909090909089,
-            "green_circuit": 1636.3636363636356,
-            "iron_plate": 1363.6363636363658
+            "copper_plate": 4090.909090909091,
+            "green_circuit": 1636.3636363636363,
+            "iron_plate": 1363.6363636363635
           },
           "raw_consumption_per_min": {
-            "copper_ore": 4090.90909090909,
-            "iron_ore": 1363.636363636364
+            "copper_ore": 4090.909090909091,
+            "iron_ore": 1363.6363636363635
           },
           "status": "ok"
         }
@@ -163,10 +144,10 @@ CASES = [
             "assembler": 1
           },
           "per_recipe_crafts_per_min": {
-            "blue_chip": 300.00000000000017
+            "blue_chip": 300.0
           },
           "raw_consumption_per_min": {
-            "iron_ore": 300.0000000000003
+            "iron_ore": 300.0
           },
           "status": "ok"
         }
@@ -224,14 +205,14 @@ CASES = [
             "chemical": 5
           },
           "per_recipe_crafts_per_min": {
-            "copper_plate": 4090.9090909090905,
-            "green_circuit": 1636.363636363636,
-            "iron_plate": 1363.6363636363662,
+            "copper_plate": 4090.909090909091,
+            "green_circuit": 1636.3636363636363,
+            "iron_plate": 1363.6363636363635,
             "red_circuit": 0.0
           },
           "raw_consumption_per_min": {
-            "copper_ore": 4090.9090909090924,
-            "iron_ore": 1363.636363636365
+            "copper_ore": 4090.909090909091,
+            "iron_ore": 1363.6363636363637
           },
           "status": "ok"
         }
@@ -289,14 +270,54 @@ CASES = [
             "chemical": 7
           },
           "per_recipe_crafts_per_min": {
-            "copper_plate": 7438.0165289256265,
-            "green_circuit": 2975.206611570251,
-            "iron_plate": 979.338842975204,
-            "potion": 1636.3636363636383
+            "copper_plate": 7438.016528925618,
+            "green_circuit": 2975.2066115702473,
+            "iron_plate": 979.3388429752063,
+            "potion": 1636.3636363636363
+          },
+          "raw_consumption_per_min": {
+            "copper_ore": 7438.016528925618,
+            "iron_ore": 979.3388429752063
+          },
+          "status": "ok"
+        }
+        """
+    },
+    {
+        "id": "alternative_recipes",
+        # Other feasible mixes exist; only the raw-draw objective picks gear_b
+        "objective_dependent": True,
+        "input": r"""
+        {
+          "machines": {
+            "assembler_1": {"crafts_per_min": 30}
+          },
+          "recipes": {
+            "gear_a": {"machine": "assembler_1", "time_s": 1, "in": {"iron_ore": 4}, "out": {"gear": 3}},
+            "gear_b": {"machine": "assembler_1", "time_s": 1, "in": {"iron_ore": 1}, "out": {"gear": 3}},
+            "gear_c": {"machine": "assembler_1", "time_s": 1, "in": {"iron_ore": 4}, "out": {"gear": 2}},
+            "gear_d": {"machine": "assembler_1", "time_s": 1, "in": {"iron_ore": 2}, "out": {"gear": 2}}
+          },
+          "limits": {
+            "raw_supply_per_min": {"iron_ore": 1000},
+            "max_machines": {"assembler_1": 100}
+          },
+          "target": {"item": "gear", "rate_per_min": 1800}
+        }
+        """ ,
+        "expected": r"""
+        {
+          "per_machine_counts": {
+            "assembler_1": 1
+          },
+          "per_recipe_crafts_per_min": {
+            "gear_a": 0.0,
+            "gear_b": 600.0,
+            "gear_c": 0.0,
+            "gear_d": 0.0
           },
           "raw_consumption_per_min": {
-            "copper_ore": 7438.016528925625,
-            "iron_ore": 979.3388429752094
+            "iron_ore": 600.0
           },
           "status": "ok"
         }
@@ -304,8 +325,83 @@ CASES = [
     },
 ]
 
-@pytest.mark.parametrize("case", CASES, ids=[c.get("id", f"case_{i}") for i, c in enumerate(CASES)])
-def test_belts_cases(case):
-    actual = run_cli("factory/main.py", case["input"])
-    expected = json.loads(case["expected"])
-    assert actual == expected, f"\n[{case.get('id','case')}] Expected:\n{json.dumps(expected,indent=2)}\nActual:\n{json.dumps(actual,indent=2)}"
+# Fill in ids, minify and UTF-8 encode inputs once, at collection time
+CASES = [{**c,
+          "id": c.get("id", f"case_{i}"),
+          "input_bytes": json.dumps(loads(c["input"]), separators=(",", ":")).encode("utf-8")}
+         for i, c in enumerate(CASES)]
+
+@pytest.mark.parametrize("case", CASES, ids=[c["id"] for c in CASES])
+def test_factory_cases(case, factory_results):
+    assert_json_eq(factory_results[case["id"]], case["expected"], case["id"])
+
+def test_factory_single_input_cli(run_cli):
+    # python factory/main.py < input.json, as documented, rather than --batch
+    case = CASES[0]
+    assert_json_eq(run_cli("factory/main.py", case["input"]), case["expected"], case["id"])
+
+def test_factory_serve(serve):
+    # One --serve process answers every case, one JSON line each way
+    send = serve("factory/main.py")
+    for case in CASES:
+        assert_json_eq(send(case["input_bytes"]), case["expected"], case["id"])
+
+# DENSE_LP_MAX_VARS is above every case, so force the sparse HiGHS path and, past
+# it, the NNLS and projected least-squares fallbacks. Different paths may differ
+# in the last bits, so floats are compared with a tolerance.
+@pytest.mark.parametrize("path", ["highs", "nnls", "projected"])
+@pytest.mark.parametrize("case", CASES, ids=[c["id"] for c in CASES])
+def test_factory_cases_large_system_paths(case, path, monkeypatch):
+    scipy_optimize = pytest.importorskip("scipy.optimize")
+    from factory import main as factory_main
+    monkeypatch.setattr(factory_main, "DENSE_LP_MAX_VARS", -1)
+    if path != "highs":
+        monkeypatch.setattr(scipy_optimize, "linprog",
+                            lambda *args, **kwargs: scipy_optimize.OptimizeResult(status=4, x=None))
+    if path == "projected":
+        def nnls_raises(*args, **kwargs):
+            raise RuntimeError("forced")
+        monkeypatch.setattr(scipy_optimize, "nnls", nnls_raises)
+
+    data = loads(case["input"])
+    result = factory_main.solve_factory(data)
+    if path == "highs" or not case.get("objective_dependent"):
+        assert_json_close(result, case["expected"], case["id"])
+        return
+    # The least-squares fallbacks have no objective: any mix within the caps will do
+    assert result["status"] == loads(case["expected"])["status"]
+    caps = data["limits"]["raw_supply_per_min"]
+    for raw, used in result["raw_consumption_per_min"].items():
+        assert used <= caps[raw] + 1e-9, (case["id"], raw, used)
+
+def _systems():
+    """Small LPs with degenerate vertices, redundant rows, or no feasible point."""
+    rng = np.random.default_rng(1234)
+    for _ in range(40):
+        m, n = rng.integers(2, 6), rng.integers(4, 10)
+        A = rng.integers(-3, 4, size=(m, n)).astype(float)
+        # Degenerate: b is built from a point with several zero coordinates
+        z0 = np.where(rng.random(n) < 0.5, 0.0, rng.integers(0, 5, size=n).astype(float))
+        b = A @ z0
+        if rng.random() < 0.5:
+            # Redundant rows: a copy and a combination of existing rows
+            A = np.vstack([A, A[0], A[0] + 2 * A[-1]])
+            b = np.concatenate([b, b[:1], b[:1] + 2 * b[-1:]])
+        c = rng.integers(0, 5, size=n).astype(float)
+        yield c, A, b
+    # Infeasible: x1 + x2 = 1 and x1 + x2 = 2
+    yield np.ones(2), np.array([[1.0, 1.0], [1.0, 1.0]]), np.array([1.0, 2.0])
+    # Unbounded below: x1 - x2 = 0 with cost -x1
+    yield np.array([-1.0, 0.0]), np.array([[1.0, -1.0]]), np.array([0.0])
+
+@pytest.mark.parametrize("c, A, b", list(_systems()))
+def test_dense_simplex_matches_linprog(c, A, b):
+    scipy_optimize = pytest.importorskip("scipy.optimize")
+    from factory.main import dense_simplex
+    z, status = dense_simplex(c, A, b)
+    ref = scipy_optimize.linprog(c, A_eq=A, b_eq=b, bounds=(0, None), method="highs")
+    assert status == {0: 0, 2: 2, 3: 3}[ref.status]
+    if status == 0:
+        assert np.all(z >= 0)
+        np.testing.assert_allclose(A @ z, b, atol=1e-9)
+        assert c @ z == pytest.approx(ref.fun, rel=1e-9, abs=1e-9)